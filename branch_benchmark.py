@@ -0,0 +1,85 @@
+import argparse
+import contextlib
+import os
+import time
+from nudging_env import NudgingEnv
+
+NUM_ACTIONS = 12
+ROLLOUT_DEPTH = 10
+NUM_DECISIONS = 5
+# budgets for capturing and restoring the state of the env (about 30 us each when measured, deepcopy takes milliseconds)
+GET_STATE_BUDGET_US = 100
+SET_STATE_BUDGET_US = 100
+
+
+# branch the world from the current state for every action, follow each branch with a random rollout,
+# and restore the state afterwards; returns the total reward of each branch
+def branch_and_rollout(env, depth = ROLLOUT_DEPTH):
+    root = env.get_state()
+    returns = []
+    for action in range(NUM_ACTIONS):
+        env.set_state(root)
+        obs, total_reward, done, info = env.step(action)
+        for i in range(depth - 1):
+            if done:
+                break
+            obs, reward, done, info = env.step(env.action_space.sample())
+            total_reward += reward
+        returns.append(total_reward)
+    env.set_state(root)
+    return returns
+
+
+# time get_state/set_state, then a greedy lookahead agent choosing its actions by branch-and-rollout
+def run_benchmark(num_decisions = NUM_DECISIONS, depth = ROLLOUT_DEPTH, seed = 0, repeats = 1000):
+    env = NudgingEnv(seed = seed)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        env.reset()
+        # a few steps, so the pyactr productions are registered as they would be in the middle of an episode
+        for i in range(20):
+            env.step(env.action_space.sample())
+
+        start = time.perf_counter()
+        for i in range(repeats):
+            state = env.get_state()
+        get_time = (time.perf_counter() - start) / repeats
+        start = time.perf_counter()
+        for i in range(repeats):
+            env.set_state(state)
+        set_time = (time.perf_counter() - start) / repeats
+
+        # restoring the same state must give the same branch returns
+        deterministic = branch_and_rollout(env, depth) == branch_and_rollout(env, depth)
+
+        start = time.perf_counter()
+        num_rollouts = 0
+        for decision in range(num_decisions):
+            returns = branch_and_rollout(env, depth)
+            num_rollouts += len(returns)
+            obs, reward, done, info = env.step(returns.index(max(returns)))
+            if done:
+                env.reset()
+        elapsed = time.perf_counter() - start
+    return {'get_state_us': get_time * 1e6,
+            'set_state_us': set_time * 1e6,
+            'deterministic': deterministic,
+            'rollouts_per_second': num_rollouts / elapsed,
+            'decisions_per_second': num_decisions / elapsed}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmark state capture/restore and branch-and-rollout throughput of NudgingEnv.')
+    parser.add_argument('--decisions', type = int, default = NUM_DECISIONS)
+    parser.add_argument('--depth', type = int, default = ROLLOUT_DEPTH)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--get-budget', type = float, default = GET_STATE_BUDGET_US, help = 'maximum get_state time in us')
+    parser.add_argument('--set-budget', type = float, default = SET_STATE_BUDGET_US, help = 'maximum set_state time in us')
+    args = parser.parse_args()
+
+    result = run_benchmark(args.decisions, args.depth, args.seed)
+    print(f"get_state: {result['get_state_us']:.1f} us \t set_state: {result['set_state_us']:.1f} us")
+    print(f"Branches reproducible after restore: {result['deterministic']}")
+    print(f"Rollouts: {result['rollouts_per_second']:.1f}/s (depth {args.depth}) \t decisions: {result['decisions_per_second']:.2f}/s")
+    assert result['deterministic'], 'restoring the state did not reproduce the same branches'
+    assert result['get_state_us'] <= args.get_budget, f"get_state takes {result['get_state_us']:.1f} us, over the {args.get_budget} us budget"
+    assert result['set_state_us'] <= args.set_budget, f"set_state takes {result['set_state_us']:.1f} us, over the {args.set_budget} us budget"
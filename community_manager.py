@@ -1,4 +1,6 @@
 from community_model import CommunityModel
+from message_catalog import MessageCatalog
+from surrogate_response import SurrogateCommunityModel
 import random
 from copy import deepcopy
 
@@ -6,28 +8,60 @@ NUM_COMMUNITIES = 4
 TOTAL_RESOURCES_AVAILABLE = 120
 TOTAL_RESOURCES_REQUIRED = 100
 
+# checks that the overall distribution is insufficient
+def insufficient(available_resources, required_resources):
+    for i in range(NUM_COMMUNITIES):
+        if available_resources[i] < required_resources[i]:
+            return True
+    return False
+
+# draws initial resources of the communities until their distribution is insufficient, used for preset episodes
+def random_insufficient_resources(rng = random):
+    while True:
+        available_resources = [rng.randint(0,TOTAL_RESOURCES_AVAILABLE//4) for i in range(NUM_COMMUNITIES)]
+        required_resources = [rng.randint(0,TOTAL_RESOURCES_REQUIRED//4) for i in range(NUM_COMMUNITIES)]
+        if insufficient(available_resources, required_resources):
+            return [available_resources, required_resources]
+
 # manager to store community objects and provide their features to the RL agent over episodes
 class CommunityManager:
 
-    def __init__(self):
+    def __init__(self, catalog = None, seed = None, surrogate_backend = None):
+        # all communities share one catalog of conditions and messages
+        self.catalog = catalog if catalog is not None else MessageCatalog()
+        # own random stream for resource initialization, the communities' seeds are drawn from it
+        self.random = random.Random(seed if seed is not None else random.getrandbits(32))
+
         # initialize communities, with 0 karma points
         self.communities = []
         for i in range(NUM_COMMUNITIES):
-            self.communities.append(CommunityModel(i, 1,
-            subsymbolic=True, utility_noise=5, utility_learning=True, strict_harvesting=True))
+            if surrogate_backend is None:
+                community = CommunityModel(i, 1, self.catalog, self.random.getrandbits(32),
+                subsymbolic=True, utility_noise=5, utility_learning=True, strict_harvesting=True)
+            else:
+                # low-fidelity communities answering mostly from a fitted surrogate, see surrogate_response.py
+                community = SurrogateCommunityModel(i, 1, self.catalog, self.random.getrandbits(32), surrogate_backend,
+                subsymbolic=True, utility_noise=5, utility_learning=True, strict_harvesting=True)
+            self.communities.append(community)
+
+    # reseed the random streams of the manager and its communities
+    def seed(self, seed):
+        self.random = random.Random(seed)
+        for community in self.communities:
+            community.seed(self.random.getrandbits(32))
 
     # initialize resources between communities    
     def initialize_resources(self, karma_points):
         while True:
             # try allocating           
             # agency has a varying amount of resources each time
-            agency_resources = random.randint(25, 50)
+            agency_resources = self.random.randint(25, 50)
 
             # agency allocates resources solely based on karma points
             available_resources_agency = self.agency_allocate(agency_resources, karma_points)
 
             # randomly initialize each community's required resources
-            required_resources = [random.randint(0,TOTAL_RESOURCES_REQUIRED//4) for i in range(NUM_COMMUNITIES)]
+            required_resources = [self.random.randint(0,TOTAL_RESOURCES_REQUIRED//4) for i in range(NUM_COMMUNITIES)]
             for i in range(NUM_COMMUNITIES):
                 print(f'Community {i}: Karma Points: {self.communities[i].karma_points}, Agency Allocation: {available_resources_agency[i]}')
             available_resources = deepcopy(available_resources_agency)
@@ -35,7 +69,7 @@ class CommunityManager:
 
             # randomly allocate initial resources possessed by the community in addition to agency allocation
             for i in range(NUM_COMMUNITIES):
-                available_resources[i] += random.randint(0,(TOTAL_RESOURCES_AVAILABLE-agency_resources)//4)
+                available_resources[i] += self.random.randint(0,(TOTAL_RESOURCES_AVAILABLE-agency_resources)//4)
 
             # enough resources are available but they are not distributed for sufficiency
             if sum(available_resources) >= sum(required_resources) and self.insufficient(available_resources, required_resources):
@@ -48,8 +82,5 @@ class CommunityManager:
 
     # checks that the overall distribution is insufficient
     def insufficient(self, available_resources, required_resources):
-        for i in range(NUM_COMMUNITIES):
-            if available_resources[i] < required_resources[i]:
-                return True
-        return False
+        return insufficient(available_resources, required_resources)
                 
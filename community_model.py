@@ -2,7 +2,8 @@ import pyactr as actr
 import numpy as np
 import random
 import re
-from copy import deepcopy
+import threading
+from message_catalog import MessageCatalog
 
 # sentiments start fixed between communities
 sentiments = [[1, 0.7, 0.6, 0.3],
@@ -14,38 +15,92 @@ NUM_COMMUNITIES = 4
 NUM_TRIGGER_WORDS = 2 # assuming each community has 2 trigger words for simplicity
 POSSIBLE_TRIGGER_WORDS = ['infants', 'babies', 'children', 'sick', 'elderly', 'family']
 
+# initialize pyactr chunk types, once: pyactr stores them globally, not per model
+actr.chunktype("start_donor", "sentiment, resource_amount")
+actr.chunktype("start_recipient", "sentiment, resource_requirement")
+
+# pyactr keeps chunk types, similarities and its utility noise in module globals,
+# so simulations of different community models must not run at the same time
+ACTR_LOCK = threading.Lock()
+
+# production names, in the order of their utilities
+DONOR_PRODUCTIONS = ['neutral_surplus_accept', 'neutral_surplus_reject', 'neutral_maintenance_accept', 'neutral_maintenance_reject',
+                    'positive_surplus_accept', 'positive_surplus_reject', 'positive_maintenance_accept', 'positive_maintenance_reject',
+                    'negative_surplus_accept', 'negative_surplus_reject', 'negative_maintenance_accept', 'negative_maintenance_reject']
+RECIPIENT_PRODUCTIONS = ['neutral_desirable_accept_donation', 'neutral_desirable_reject_donation', 'neutral_desperate_accept_donation', 'neutral_desperate_reject_donation',
+                        'positive_desirable_accept_donation', 'positive_desirable_reject_donation', 'positive_desperate_accept_donation', 'positive_desperate_reject_donation',
+                        'negative_desirable_accept_donation', 'negative_desirable_reject_donation', 'negative_desperate_accept_donation', 'negative_desperate_reject_donation']
+
 
 # define the model for a community, modeling their responses to a nudge with the cognitive architecture ACT-R (pyactr)
 class CommunityModel:
-    def __init__(self, id, karma_points, **kwargs):
+    def __init__(self, id, karma_points, catalog = None, seed = None, **kwargs):
         self.id = id # 0,1,2,3
         self.karma_points = karma_points
+        self.catalog = catalog if catalog is not None else MessageCatalog()
         self.actr_response_model = actr.ACTRModel(**kwargs)
 
-        # initialize pyactr chunk types
-        actr.chunktype("start_donor", "sentiment, resource_amount")
-        actr.chunktype("start_recipient", "sentiment, resource_requirement")
+        # each community has its own random stream, so models in different envs or threads are independent
+        # without an explicit seed, it is drawn from the global random module
+        self.seed(seed if seed is not None else random.getrandbits(32))
 
         self.utilities = [0 for i in range(24)]
         self.sentiment_val = 0
         self.donor = None
         self.recipient = None
-        self.sentiments = sentiments[id]
+        self.fired_production = None
+        self.response_log = None # set to a list to record the state and outcome of every response
+        self.sentiments = list(sentiments[id]) # own copy, sentiments change with accepted donations
 
-        # possible conditions that can exist in a community at any given time
-        self.possible_conditions = ['Infants and babies in this community are starving everyday.',
-                            'The children of this community are in dire need of donations.',
-                            'The sick and the elderly of this community are dying due to lack of resources.',
-                            'There is a family in this community that needs resources to survive.']
+        # possible conditions that can exist in a community at any given time, identified by their index in the catalog
+        self.possible_conditions = self.catalog.conditions
+        self.current_conditions_mask = np.zeros(self.catalog.num_conditions, dtype=bool)
+        self.current_conditions = np.flatnonzero(self.current_conditions_mask)
 
         # assuming each community has 2 trigger words they respond to, which increases their chances of accepting a nudge to donate
-        self.trigger_words = deepcopy(random.sample(POSSIBLE_TRIGGER_WORDS, NUM_TRIGGER_WORDS))
+        self.trigger_words = [POSSIBLE_TRIGGER_WORDS[i] for i in self.np_random.choice(len(POSSIBLE_TRIGGER_WORDS), NUM_TRIGGER_WORDS, replace = False)]
         self.donor_to_recipient = {0: [1,2,3],
                                     1: [0,2,3],
                                     2:[0,1,3],
                                     3:[0,1,2]}
 
 
+    # reseed the random stream of the community, used for current conditions and the ACT-R utility noise
+    # (a PCG64 generator, whose state is a few words, so taking and restoring it for branching is cheap)
+    def seed(self, seed):
+        self.np_random = np.random.Generator(np.random.PCG64(seed))
+
+    # a 32 bit seed drawn from the community's stream, for the streams derived from it
+    def derive_seed(self):
+        return int(self.np_random.integers(2**32))
+
+
+    # minimal mutable state of the community, to branch the simulation without copying the pyactr model
+    def get_state(self):
+        return {'available_resources': self.available_resources,
+                'required_resources': self.required_resources,
+                'karma_points': self.karma_points,
+                'sentiments': list(self.sentiments),
+                'utilities': list(self.utilities),
+                'productions': list(self.actr_response_model.productions),
+                'np_random': self.np_random.bit_generator.state}
+
+    def set_state(self, state):
+        self.available_resources = state['available_resources']
+        self.required_resources = state['required_resources']
+        self.karma_points = state['karma_points']
+        self.sentiments[:] = state['sentiments']
+        self.utilities[:] = state['utilities']
+        # the productions registered so far decide how many noise values pyactr draws,
+        # so productions registered after the state was taken are removed (they are parsed again when needed)
+        productions = self.actr_response_model.productions
+        if not set(state['productions']) <= set(productions):
+            raise ValueError(f'state has productions that community {self.id} has not registered yet')
+        for name in list(productions):
+            if name not in state['productions']:
+                del productions[name]
+        self.np_random.bit_generator.state = state['np_random']
+
     def set_available_resources(self, available_resources):
         self.available_resources = available_resources
 
@@ -54,6 +109,17 @@ class CommunityModel:
         self.required_resources = required_resources
 
 
+    # productions are parsed once, on the first response in that role; afterwards only their utility and reward are updated
+    # (in the same order, so the registered productions and their noise draws are the same as when re-adding them)
+    def prepare_productions(self, production_names, utility_offset, initialize_productions):
+        productions = self.actr_response_model.productions
+        if production_names[0] not in productions:
+            initialize_productions()
+            return
+        for i, name in enumerate(production_names):
+            productions[name]['utility'] = self.utilities[utility_offset + i]
+            productions[name]['reward'] = self.calculate_reward(name)
+
     # initialize all possible donor productions
     def initialize_donor_productions(self):
         self.actr_response_model.productionstring(name="neutral_surplus_accept", string="""
@@ -301,8 +367,16 @@ class CommunityModel:
         )
 
 
-    # convert action to its meaning and run simulation to get response
+    # get response to a nudge, running the ACT-R simulation with this community's own random stream
     def get_response(self, action, nudge_message = None):
+        with ACTR_LOCK:
+            # pyactr draws its noise from the global numpy random state, which is seeded from the community's stream
+            # for each response (cheaper than swapping the full MT19937 state in and out; the global state is not restored)
+            np.random.seed(self.derive_seed())
+            return self.simulate_response(action, nudge_message)
+
+    # convert action to its meaning and run simulation to get response
+    def simulate_response(self, action, nudge_message = None):
 
         is_donor = False
         if nudge_message:
@@ -316,38 +390,23 @@ class CommunityModel:
             print(f'Community {self.id}\'s trigger words: {self.trigger_words}')
 
             # run donating simulation
-            self.initialize_donor_productions()
-            self.sentiment_val = self.sentiments[self.recipient]
-            if 0.4 <= self.sentiment_val <= 0.6:
-                sentiment = "neutral"
-            elif self.sentiment_val < 0.4:
-                sentiment = "negative"
-            else:
-                sentiment = "positive"
-            if self.available_resources >= 1.25 * self.required_resources: # surplus
-                self.actr_response_model.goal.add(actr.makechunk(typename = "start_donor", sentiment = sentiment, resource_amount = "surplus"))
-            else:
-                self.actr_response_model.goal.add(actr.makechunk(typename = "start_donor", sentiment = sentiment, resource_amount = "maintenance"))
+            self.prepare_productions(DONOR_PRODUCTIONS, 0, self.initialize_donor_productions)
+            sentiment, resources = self.response_state(is_donor)
+            self.actr_response_model.goal.add(actr.makechunk(typename = "start_donor", sentiment = sentiment, resource_amount = resources))
         else:
             # run recipient simulation
-            self.initialize_recipient_productions()
-            self.sentiment_val = self.sentiments[self.donor]
-            if 0.4 <= self.sentiment_val <= 0.6:
-                sentiment = "neutral"
-            elif self.sentiment_val < 0.4:
-                sentiment = "negative"
-            else:
-                sentiment = "positive"
-            if self.available_resources <= 0.75 * self.required_resources: # desperate
-                self.actr_response_model.goal.add(actr.makechunk(typename = "start_recipient", sentiment = sentiment, resource_requirement = "desperate"))
-            else:
-                self.actr_response_model.goal.add(actr.makechunk(typename = "start_recipient", sentiment = sentiment, resource_requirement = "desirable"))
+            self.prepare_productions(RECIPIENT_PRODUCTIONS, 12, self.initialize_recipient_productions)
+            sentiment, resources = self.response_state(is_donor)
+            self.actr_response_model.goal.add(actr.makechunk(typename = "start_recipient", sentiment = sentiment, resource_requirement = resources))
 
         sim = self.actr_response_model.simulation(trace = False)
         sim.steps(2)
         print(f'PRODUCTION FIRED: {sim.current_event}')
-        response = sim.current_event.action.split(': ')[1].split('_')[2]
+        self.fired_production = sim.current_event.action.split(': ')[1]
+        response = self.fired_production.split('_')[2]
         self.response = (response == 'accept')
+        if self.response_log is not None:
+            self.response_log.append(self.response_record(is_donor, sentiment, resources))
 
         if self.response and not is_donor:
             # increase recipient's sentiments towards donor
@@ -355,12 +414,52 @@ class CommunityModel:
             self.sentiment_val = self.sentiments[self.donor]
 
         sim.run()
+        # the cleared goal is harvested into declarative memory, which would otherwise keep a timestamp for every response
+        # the model never retrieves from it, so forgetting them keeps memory bounded without changing responses
+        self.actr_response_model.decmem.clear()
         if is_donor:
             self.set_donor_utilities()
         else:
             self.set_recipient_utilities()
         return self.response
 
+    # sentiment bucket and resource state that the response productions match on
+    def response_state(self, is_donor):
+        if is_donor:
+            self.sentiment_val = self.sentiments[self.recipient]
+        else:
+            self.sentiment_val = self.sentiments[self.donor]
+        if 0.4 <= self.sentiment_val <= 0.6:
+            sentiment = "neutral"
+        elif self.sentiment_val < 0.4:
+            sentiment = "negative"
+        else:
+            sentiment = "positive"
+        if is_donor:
+            resources = "surplus" if self.available_resources >= 1.25 * self.required_resources else "maintenance"
+        else:
+            resources = "desperate" if self.available_resources <= 0.75 * self.required_resources else "desirable"
+        return sentiment, resources
+
+    # indices in self.utilities of the accept and reject productions for a state (the reject production follows the accept one)
+    def response_utility_indices(self, is_donor, sentiment, resources):
+        if is_donor:
+            accept_index = DONOR_PRODUCTIONS.index(f'{sentiment}_{resources}_accept')
+        else:
+            accept_index = 12 + RECIPIENT_PRODUCTIONS.index(f'{sentiment}_{resources}_accept_donation')
+        return accept_index, accept_index + 1
+
+    # everything the response depended on, with the utilities from before the production fired, and the outcome
+    def response_record(self, is_donor, sentiment, resources):
+        accept_index, reject_index = self.response_utility_indices(is_donor, sentiment, resources)
+        return {'role': 'donor' if is_donor else 'recipient',
+                'sentiment': sentiment,
+                'resources': resources,
+                'trigger_factor': self.trigger_factor(self.nudge_message) if is_donor else 1,
+                'utility_accept': self.utilities[accept_index],
+                'utility_reject': self.utilities[reject_index],
+                'accepted': self.response}
+
     def convert_action(self, action):
         donor = action//(NUM_COMMUNITIES-1)
         recipient_index = action%(NUM_COMMUNITIES-1)
@@ -397,6 +496,15 @@ class CommunityModel:
                     self.actr_response_model.productions['negative_desperate_reject_donation']['utility']]
 
 
+    # if the message contains trigger words for the community, they are more likely to accept
+    def trigger_factor(self, message):
+        message_words = set(re.split('[ !,.]', message.lower()))
+        trigger_factor = 1
+        for trigger_word in self.trigger_words:
+            if trigger_word in message_words:
+                trigger_factor *= 1.5
+        return trigger_factor
+
     # calculate reward for the productions
     def calculate_reward(self, response_string):
         if self.available_resources == self.required_resources:
@@ -407,13 +515,7 @@ class CommunityModel:
         if len(response_array) == 3:
             # donor
             self.sentiment_val = self.sentiments[self.recipient]
-            message_words = set(re.split('[ !,.]', self.nudge_message.lower()))
-
-            # if the message contains trigger words for the community, they are more likely to accept
-            trigger_factor = 1
-            for trigger_word in self.trigger_words:
-                if trigger_word in message_words:
-                    trigger_factor *= 1.5
+            trigger_factor = self.trigger_factor(self.nudge_message)
             if response:
                 # donor acceptance
                 reward = trigger_factor * self.sentiment_val * (self.available_resources - self.required_resources)
@@ -435,35 +537,6 @@ class CommunityModel:
 
     # simulate current conditions in the community at a given time, so the message bandit can generate a true message nudge
     def simulate_current_conditions(self):
-        self.current_conditions = []      
-        for condition in self.possible_conditions:
-            # 50% probability of each possible condition being true at any time
-            if random.uniform(0,1) >= 0.5:
-                self.current_conditions.append(condition)
-
-
-
-        
-
-
-
-
-        
-        
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-       
-    
+        self.current_conditions_mask = self.catalog.sample_conditions(self.np_random)
+        # ids of the conditions currently present
+        self.current_conditions = np.flatnonzero(self.current_conditions_mask)
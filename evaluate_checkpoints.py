@@ -0,0 +1,136 @@
+import argparse
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import random
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from community_manager import random_insufficient_resources
+from nudging_env import NudgingEnv
+from numpy_policy import load_policy
+
+NUM_SCENARIOS = 20
+MAX_EPISODE_STEPS = 2000 # cap so a bad checkpoint cannot stall the evaluation
+CACHE_DIR_NAME = '.eval_cache'
+
+
+# fixed set of seeded scenarios, so every checkpoint is evaluated on the same initial resources and random streams
+def make_scenarios(num_scenarios = NUM_SCENARIOS, seed = 0):
+    rng = random.Random(seed)
+    scenarios = []
+    for i in range(num_scenarios):
+        available_resources, required_resources = random_insufficient_resources(rng)
+        scenarios.append({'available_resources': available_resources,
+                        'required_resources': required_resources,
+                        'seed': rng.randrange(2**31)})
+    return scenarios
+
+
+def scenario_set_hash(scenarios, max_steps):
+    data = json.dumps({'scenarios': scenarios, 'max_steps': max_steps}, sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# run one deterministic episode of the policy per scenario
+def evaluate_checkpoint(path, scenarios, max_steps = MAX_EPISODE_STEPS):
+    rewards = []
+    steps = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        model = load_policy(path)
+        for scenario in scenarios:
+            env = NudgingEnv(scenario['available_resources'], scenario['required_resources'], seed = scenario['seed'])
+            obs = env.reset()
+            done = False
+            num_steps = 0
+            episode_reward = 0
+            while not done and num_steps < max_steps:
+                action, _states = model.predict(obs, deterministic = True)
+                obs, reward, done, info = env.step(int(action))
+                episode_reward += reward
+                num_steps += 1
+            rewards.append(episode_reward)
+            steps.append(num_steps)
+    return {'rewards': rewards, 'steps': steps}
+
+
+# evaluate a checkpoint unless a result for the same checkpoint contents and scenario set is cached
+def cached_evaluation(path, scenarios, max_steps, cache_dir):
+    checkpoint_hash = file_hash(path)
+    scenarios_hash = scenario_set_hash(scenarios, max_steps)
+    cache_path = os.path.join(cache_dir, f'{checkpoint_hash}_{scenarios_hash[:16]}.json')
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f), True
+
+    result = evaluate_checkpoint(path, scenarios, max_steps)
+    result.update({'checkpoint_hash': checkpoint_hash, 'scenarios_hash': scenarios_hash})
+    # write then rename, so a concurrent or interrupted run never sees a partial file
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f)
+    os.replace(tmp_path, cache_path)
+    return result, False
+
+
+# checkpoints are saved as <timesteps>.zip by nudging_learn.py
+def checkpoint_timesteps(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return int(name) if name.isdigit() else -1
+
+
+def evaluate_run(run_dir, num_scenarios = NUM_SCENARIOS, seed = 0, max_steps = MAX_EPISODE_STEPS, workers = None, cache_dir = None):
+    cache_dir = cache_dir or os.path.join(run_dir, CACHE_DIR_NAME)
+    os.makedirs(cache_dir, exist_ok=True)
+    # an exported .npz next to its .zip is the same checkpoint, evaluate it once
+    zips = glob.glob(os.path.join(run_dir, '*.zip'))
+    exported = [path for path in glob.glob(os.path.join(run_dir, '*.npz')) if os.path.splitext(path)[0] + '.zip' not in zips]
+    checkpoints = sorted(zips + exported,
+                        key = lambda path: (checkpoint_timesteps(path), path))
+    scenarios = make_scenarios(num_scenarios, seed)
+
+    curve = []
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        futures = [executor.submit(cached_evaluation, path, scenarios, max_steps, cache_dir) for path in checkpoints]
+        for path, future in zip(checkpoints, futures):
+            result, cached = future.result()
+            curve.append({'checkpoint': path,
+                        'timesteps': checkpoint_timesteps(path),
+                        'mean_reward': float(np.mean(result['rewards'])),
+                        'mean_steps': float(np.mean(result['steps'])),
+                        'cached': cached})
+    best = max(curve, key = lambda point: point['mean_reward']) if curve else None
+    return curve, best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Evaluate every checkpoint in a run directory on a fixed set of seeded scenarios.')
+    parser.add_argument('run_dir', help = 'directory with checkpoints, e.g. models/1669480859')
+    parser.add_argument('--scenarios', type = int, default = NUM_SCENARIOS)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--max-steps', type = int, default = MAX_EPISODE_STEPS)
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--cache-dir', default = None, help = f'default: <run_dir>/{CACHE_DIR_NAME}')
+    parser.add_argument('--csv', default = None, help = 'also write the learning curve to this csv file')
+    args = parser.parse_args()
+
+    curve, best = evaluate_run(args.run_dir, args.scenarios, args.seed, args.max_steps, args.workers, args.cache_dir)
+    print('TIMESTEPS\t MEAN REWARD\t MEAN STEPS\t CACHED')
+    for point in curve:
+        print(f"{point['timesteps']}\t {point['mean_reward']:.1f}\t {point['mean_steps']:.1f}\t {point['cached']}")
+    if args.csv:
+        with open(args.csv, 'w') as f:
+            f.write('checkpoint,timesteps,mean_reward,mean_steps\n')
+            for point in curve:
+                f.write(f"{point['checkpoint']},{point['timesteps']},{point['mean_reward']},{point['mean_steps']}\n")
+    if best:
+        print(f"\nBest checkpoint: {best['checkpoint']} (mean reward {best['mean_reward']:.1f})")
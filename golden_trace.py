@@ -0,0 +1,175 @@
+import argparse
+import contextlib
+import importlib
+import os
+import random
+import numpy as np
+from statistics import NormalDist
+from nudging_env import NudgingEnv
+
+NUM_STEPS = 500
+SEED = 0
+# fields stored per step in a trace, in the order they are compared on replay
+TRACE_FIELDS = ['actions', 'productions', 'responses', 'rewards', 'dones', 'utilities', 'sentiments', 'bandit_probs']
+FLOAT_FIELDS = ['rewards', 'utilities', 'sentiments', 'bandit_probs']
+
+
+# resolve a backend given as "module:callable", which builds a NudgingEnv-like env
+def load_backend(spec):
+    if spec is None:
+        return NudgingEnv
+    module_name, factory_name = spec.split(':')
+    return getattr(importlib.import_module(module_name), factory_name)
+
+
+# seed every random stream the env uses and build it
+def make_seeded_env(env_factory, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    env = env_factory()
+    env.action_space.seed(seed)
+    return env
+
+
+# state of the env after a step, in the shape stored in a trace
+def snapshot(env, action, reward, done):
+    productions = []
+    responses = []
+    for community in env.communities:
+        productions.append(community.fired_production or '')
+        responses.append(-1 if community.fired_production is None else int(community.response))
+    return {'actions': action,
+            'productions': productions,
+            'responses': responses,
+            'rewards': reward,
+            'dones': done,
+            'utilities': [list(community.utilities) for community in env.communities],
+            'sentiments': [list(community.sentiments) for community in env.communities],
+            'bandit_probs': [list(env.message_bandit_map[community].probs) for community in env.communities]}
+
+
+# step the env with the given actions (or sampled ones), resetting whenever an episode ends
+def run_steps(env, num_steps, actions = None):
+    env.reset()
+    for i in range(num_steps):
+        for community in env.communities:
+            community.fired_production = None
+        action = int(actions[i]) if actions is not None else int(env.action_space.sample())
+        obs, reward, done, info = env.step(action)
+        yield snapshot(env, action, reward, done)
+        if done:
+            env.reset()
+
+
+def record_trace(path, seed = SEED, num_steps = NUM_STEPS, env_factory = NudgingEnv):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        env = make_seeded_env(env_factory, seed)
+        steps = list(run_steps(env, num_steps))
+    trace = {field: np.array([step[field] for step in steps]) for field in TRACE_FIELDS}
+    np.savez_compressed(path, seed = seed, **trace)
+    return trace
+
+
+# replay the recorded actions on a backend and return the first divergence, or None if the trace matches
+def replay_trace(path, env_factory = NudgingEnv, rtol = 1e-9, atol = 1e-12):
+    trace = np.load(path)
+    seed = int(trace['seed'])
+    actions = trace['actions']
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        env = make_seeded_env(env_factory, seed)
+        for step, actual in enumerate(run_steps(env, len(actions), actions)):
+            for field in TRACE_FIELDS:
+                expected = trace[field][step]
+                value = np.array(actual[field])
+                if field in FLOAT_FIELDS:
+                    matches = value.shape == expected.shape and np.allclose(value, expected, rtol = rtol, atol = atol)
+                else:
+                    matches = np.array_equal(value, expected)
+                if not matches:
+                    return {'step': step, 'field': field, 'expected': expected, 'actual': value}
+    return None
+
+
+# acceptance counts per fired production group ("<sentiment>_<resources>") and the rewards, over several seeds
+def response_statistics(env_factory, seeds, num_steps):
+    accepted = {}
+    total = {}
+    rewards = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for seed in seeds:
+            env = make_seeded_env(env_factory, seed)
+            for step in run_steps(env, num_steps):
+                rewards.append(step['rewards'])
+                for production, response in zip(step['productions'], step['responses']):
+                    if response == -1:
+                        continue
+                    group = '_'.join(production.split('_')[:2])
+                    accepted[group] = accepted.get(group, 0) + response
+                    total[group] = total.get(group, 0) + 1
+    return accepted, total, np.array(rewards, dtype = float)
+
+
+# distribution-level test for stochastic components: acceptance rates per production group (two-proportion z-tests)
+# and mean reward (Welch z-test), with a Bonferroni correction over all the tests
+def compare_distributions(reference_factory, candidate_factory, seeds, num_steps = NUM_STEPS, alpha = 0.01):
+    ref_accepted, ref_total, ref_rewards = response_statistics(reference_factory, seeds, num_steps)
+    new_accepted, new_total, new_rewards = response_statistics(candidate_factory, seeds, num_steps)
+    groups = sorted(set(ref_total) & set(new_total))
+    threshold = NormalDist().inv_cdf(1 - alpha / (2 * (len(groups) + 1)))
+
+    failures = []
+    for group in groups:
+        p1 = ref_accepted[group] / ref_total[group]
+        p2 = new_accepted[group] / new_total[group]
+        pooled = (ref_accepted[group] + new_accepted[group]) / (ref_total[group] + new_total[group])
+        se = np.sqrt(pooled * (1 - pooled) * (1 / ref_total[group] + 1 / new_total[group]))
+        if se > 0 and abs(p1 - p2) / se > threshold:
+            failures.append((group, p1, p2))
+    se = np.sqrt(ref_rewards.var(ddof = 1) / len(ref_rewards) + new_rewards.var(ddof = 1) / len(new_rewards))
+    if se > 0 and abs(ref_rewards.mean() - new_rewards.mean()) / se > threshold:
+        failures.append(('reward', ref_rewards.mean(), new_rewards.mean()))
+    missing = sorted(set(ref_total) ^ set(new_total))
+    return failures, missing
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Record seeded golden traces of NudgingEnv and check other backends against them.')
+    subparsers = parser.add_subparsers(dest = 'command', required = True)
+    record = subparsers.add_parser('record', help = 'record a reference trace')
+    record.add_argument('path')
+    record.add_argument('--seed', type = int, default = SEED)
+    record.add_argument('--steps', type = int, default = NUM_STEPS)
+    record.add_argument('--backend', help = 'module:callable building the env (default: NudgingEnv)')
+    replay = subparsers.add_parser('replay', help = 'replay a trace and report the first divergence')
+    replay.add_argument('path')
+    replay.add_argument('--backend', help = 'module:callable building the env (default: NudgingEnv)')
+    distribution = subparsers.add_parser('distribution', help = 'compare response and reward distributions of two backends')
+    distribution.add_argument('--reference', help = 'module:callable building the reference env (default: NudgingEnv)')
+    distribution.add_argument('--backend', required = True, help = 'module:callable building the candidate env')
+    distribution.add_argument('--seeds', type = int, default = 10)
+    distribution.add_argument('--steps', type = int, default = NUM_STEPS)
+    distribution.add_argument('--alpha', type = float, default = 0.01)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        trace = record_trace(args.path, args.seed, args.steps, load_backend(args.backend))
+        print(f'Recorded {len(trace["actions"])} steps to {args.path}')
+    elif args.command == 'replay':
+        divergence = replay_trace(args.path, load_backend(args.backend))
+        if divergence is None:
+            print('Trace matches')
+        else:
+            print(f"First divergence at step {divergence['step']} in {divergence['field']}")
+            print(f"expected: {divergence['expected']}")
+            print(f"actual:   {divergence['actual']}")
+            raise SystemExit(1)
+    else:
+        failures, missing = compare_distributions(load_backend(args.reference), load_backend(args.backend),
+                                                range(args.seeds), args.steps, args.alpha)
+        for name, expected, actual in failures:
+            print(f'{name}: reference {expected:.4f} \t candidate {actual:.4f}')
+        if missing:
+            print(f'Production groups fired by only one backend: {missing}')
+        if failures:
+            raise SystemExit(1)
+        print('Distributions match')
@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+import numpy as np
+from recommendation_server import HOST, PORT, NUM_COMMUNITIES
+
+PREV_ACTIONS_LEN = 30
+NUM_CONDITIONS = 4
+
+
+def random_request(rng, request_id):
+    observation = []
+    for i in range(NUM_COMMUNITIES):
+        observation += [rng.randint(0, 30), rng.randint(0, 25)]
+    observation += [rng.randint(-1, 11) for i in range(PREV_ACTIONS_LEN)]
+    conditions = [[c for c in range(NUM_CONDITIONS) if rng.random() >= 0.5] for i in range(NUM_COMMUNITIES)]
+    return {'type': 'recommend', 'id': request_id, 'observation': observation, 'conditions': conditions}
+
+
+# one connection sending recommendation requests back to back, with feedback for each suggested message
+async def client(host, port, num_requests, seed, latencies):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    for i in range(num_requests):
+        start = time.perf_counter()
+        writer.write((json.dumps(random_request(rng, i)) + '\n').encode())
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        feedback = {'type': 'feedback', 'donor': response['donor'], 'option': response['option'], 'accepted': rng.random() < 0.5}
+        writer.write((json.dumps(feedback) + '\n').encode())
+        await writer.drain()
+        await reader.readline()
+    writer.close()
+
+
+async def server_metrics(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write((json.dumps({'type': 'metrics'}) + '\n').encode())
+    await writer.drain()
+    metrics = json.loads(await reader.readline())
+    writer.close()
+    return metrics
+
+
+async def main(args):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[client(args.host, args.port, args.requests, args.seed + i, latencies) for i in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    print(f'Client: {len(latencies)} requests in {elapsed:.2f}s, {len(latencies) / elapsed:.1f} req/s, '
+        f'p50 {np.percentile(latencies, 50):.2f} ms, p99 {np.percentile(latencies, 99):.2f} ms')
+    print(f'Server: {await server_metrics(args.host, args.port)}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Send concurrent recommendation requests to a local recommendation server.')
+    parser.add_argument('--host', default = HOST)
+    parser.add_argument('--port', type = int, default = PORT)
+    parser.add_argument('--concurrency', type = int, default = 32)
+    parser.add_argument('--requests', type = int, default = 200, help = 'requests per connection')
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+    asyncio.run(main(args))
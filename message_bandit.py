@@ -1,27 +1,25 @@
 import sys
-import random
+import bisect
+import itertools
+import numpy as np
 
 # bandit agent to learn the messages that communities respond to
 class MessageBandit:
-    def __init__(self, community):
+    def __init__(self, community, seed = None):
         self.epsilon = sys.float_info.epsilon
         self.community = community # user associated with this agent
+        # own random stream for suggestions, drawn from the community's stream without an explicit seed
+        self.seed(seed if seed is not None else community.derive_seed())
         self.exp = 0.3
         self.dist = 0.2
         self.decay = 0.8
         self.rwt = 0.8
         self.w0 = 0.5
-        # nudge message and feedback
-        self.num_messages = 4
-        self.messages =  {0: ['Infants and babies in this community are starving everyday.',
-                            'The children of this community are in dire need of donations.',
-                            'The sick and the elderly of this community are dying due to lack of resources.',
-                            'There is a family in this community that needs resources to survive.'],
-                        1: ['You helped infants and babies in this community survive today with your generous donation.',
-                            'You helped children of this community today.',
-                            'You helped save some of the sick and elderly people of this community today.',
-                            'You prevented starvation in a family today.']}
-        self.keywords = [['infants','babies'], 'children', ['sick', 'elderly'], ['family']]
+        # nudge and feedback messages, identified by their id in the community's catalog
+        self.catalog = community.catalog
+        self.num_messages = self.catalog.num_messages
+        self.messages = {0: self.catalog.nudge_messages,
+                        1: self.catalog.feedback_messages}
         self.options = [i for i in range(self.num_messages)]
         self.probs = [1/self.num_messages for i in range(self.num_messages)]
         self.w = [self.w0 for i in range(self.num_messages)]
@@ -35,18 +33,33 @@ class MessageBandit:
             return ['This community needs help.', -1]
         
         # only generate a true message, something that is actually happening in the recipient community
-        currently_present_mask = [0 for i in range(self.num_messages)]
-        for i, message in enumerate(self.messages[0]):
-            if message in recipient_current_conditions:
-                currently_present_mask[i] = 1
+        # the catalog indexes messages by condition, so only the messages for the present conditions are looked at
+        candidate_options = self.catalog.messages_for(recipient_current_conditions)
+        if len(candidate_options) == 0:
+            return ['This community needs help.', -1]
 
         # suggest nudge message option based on these factors
-        wts = [(a*b)+ self.epsilon for a,b in zip(self.probs, currently_present_mask)]
-        wts_sum = sum(wts)
-        wts = [wt/wts_sum for wt in wts] # normalizing weights to use in making a suggestion
-        suggested_option = random.choices(self.options, weights = wts)[0]
+        wts = [self.probs[option] + self.epsilon for option in candidate_options]
+        cum_wts = list(itertools.accumulate(wts))
+        suggested_option = candidate_options[bisect.bisect(cum_wts, self.np_random.random() * cum_wts[-1])]
         return [self.messages[0][suggested_option], suggested_option]
 
+    # PCG64 stream, cheap to take and restore when branching
+    def seed(self, seed):
+        self.np_random = np.random.Generator(np.random.PCG64(seed))
+
+    def get_state(self):
+        return {'probs': list(self.probs),
+                'w': list(self.w),
+                'cum_rew': self.cum_rew,
+                'np_random': self.np_random.bit_generator.state}
+
+    def set_state(self, state):
+        self.probs = list(state['probs'])
+        self.w = list(state['w'])
+        self.cum_rew = state['cum_rew']
+        self.np_random.bit_generator.state = state['np_random']
+
     # learn from the community's response
     def learn(self, suggested_option, community_response):
         # learn from user's response to the suggestion
@@ -0,0 +1,76 @@
+import json
+import numpy as np
+
+# conditions that can exist in a community at any given time
+DEFAULT_CONDITIONS = ['Infants and babies in this community are starving everyday.',
+                    'The children of this community are in dire need of donations.',
+                    'The sick and the elderly of this community are dying due to lack of resources.',
+                    'There is a family in this community that needs resources to survive.']
+
+# nudge messages, with the id of the condition each message describes
+DEFAULT_NUDGE_MESSAGES = [[0, 'Infants and babies in this community are starving everyday.'],
+                        [1, 'The children of this community are in dire need of donations.'],
+                        [2, 'The sick and the elderly of this community are dying due to lack of resources.'],
+                        [3, 'There is a family in this community that needs resources to survive.']]
+
+# feedback messages, in the same order as the nudge messages
+DEFAULT_FEEDBACK_MESSAGES = ['You helped infants and babies in this community survive today with your generous donation.',
+                            'You helped children of this community today.',
+                            'You helped save some of the sick and elderly people of this community today.',
+                            'You prevented starvation in a family today.']
+
+# probability of each possible condition being true at any time
+CONDITION_PROBABILITY = 0.5
+
+
+# catalog of conditions and messages, identified by integer ids
+# messages are indexed by the condition they describe, so a suggestion only looks at the conditions currently present
+class MessageCatalog:
+    def __init__(self, conditions = DEFAULT_CONDITIONS, nudge_messages = DEFAULT_NUDGE_MESSAGES,
+                feedback_messages = DEFAULT_FEEDBACK_MESSAGES, condition_probability = CONDITION_PROBABILITY):
+        if len(nudge_messages) != len(feedback_messages):
+            raise ValueError('every nudge message needs a feedback message')
+        self.conditions = list(conditions)
+        self.num_conditions = len(self.conditions)
+        self.message_conditions = [condition_id for condition_id, _ in nudge_messages]
+        self.nudge_messages = [message for _, message in nudge_messages]
+        self.feedback_messages = list(feedback_messages)
+        self.num_messages = len(self.nudge_messages)
+        self.condition_probability = condition_probability
+
+        # condition id -> ids of the messages that are true when that condition is present
+        self.condition_to_messages = [[] for i in range(self.num_conditions)]
+        for message_id, condition_id in enumerate(self.message_conditions):
+            if not 0 <= condition_id < self.num_conditions:
+                raise ValueError(f'message {message_id} refers to unknown condition {condition_id}')
+            self.condition_to_messages[condition_id].append(message_id)
+
+    # load a catalog from a json file with "conditions", "nudge_messages" ([condition id, text] pairs) and "feedback_messages"
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['conditions'], data['nudge_messages'], data['feedback_messages'],
+                data.get('condition_probability', CONDITION_PROBABILITY))
+
+    def save(self, path):
+        data = {'conditions': self.conditions,
+                'nudge_messages': [[c, m] for c, m in zip(self.message_conditions, self.nudge_messages)],
+                'feedback_messages': self.feedback_messages,
+                'condition_probability': self.condition_probability}
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    # sample which conditions are present as a boolean mask, in one vectorized draw
+    def sample_conditions(self, rng = np.random):
+        return rng.random(self.num_conditions) < self.condition_probability
+
+    # ids of the messages that are true for the given present condition ids
+    def messages_for(self, condition_ids):
+        message_ids = []
+        for condition_id in condition_ids:
+            message_ids.extend(self.condition_to_messages[condition_id])
+        return message_ids
+
+    def describe(self, condition_ids):
+        return [self.conditions[condition_id] for condition_id in condition_ids]
@@ -9,16 +9,34 @@ import pyactr as actr
 from community_model import CommunityModel
 from community_manager import CommunityManager
 from message_bandit import MessageBandit
+from message_catalog import MessageCatalog
 
 PREV_ACTIONS_LEN = 30
 NUM_COMMUNITIES = 4
 TOTAL_RESOURCES_AVAILABLE = 105
 TOTAL_RESOURCES_REQUIRED = 100
+CRN_COMMUNITY_STREAM = 0
+CRN_BANDIT_STREAM = 1
+
+
+# numpy random generators (newer gym versions) and RandomState (older ones) keep their state differently
+def get_numpy_rng_state(rng):
+    if hasattr(rng, 'bit_generator'):
+        return rng.bit_generator.state
+    return rng.get_state()
+
+
+def set_numpy_rng_state(rng, state):
+    if hasattr(rng, 'bit_generator'):
+        rng.bit_generator.state = state
+    else:
+        rng.set_state(state)
 
 
 class NudgingEnv(gym.Env):
 
-    def __init__(self, preset_available_resources = None, preset_required_resources = None):
+    def __init__(self, preset_available_resources = None, preset_required_resources = None, message_catalog = None, seed = None, surrogate_backend = None,
+                common_random_numbers = False):
         super(NudgingEnv, self).__init__()
         # Define action and observation space
         self.preset_available_resources = preset_available_resources
@@ -36,7 +54,20 @@ class NudgingEnv(gym.Env):
 
         # communities remain the same over episodes, with new resource values initialized
         # CommunityManager stores the community objects
-        self.community_manager = CommunityManager()
+        # the message catalog can be given as an object or as the path of a json data file
+        if isinstance(message_catalog, str):
+            message_catalog = MessageCatalog.load(message_catalog)
+        # every random stream of the env is derived from its seed, so env instances are independent of each other
+        # without an explicit seed, it is drawn from the global random module
+        seed_random = random.Random(seed if seed is not None else random.getrandbits(32))
+        self.action_space.seed(seed_random.getrandbits(32))
+        # with a surrogate backend, most responses come from a fitted surrogate instead of pyactr (see surrogate_response.py)
+        self.community_manager = CommunityManager(message_catalog, seed_random.getrandbits(32), surrogate_backend)
+        # with common random numbers, the draws of every community and bandit are keyed by (seed, community, step)
+        # instead of continuing one stream, so two runs with different actions still share the draws of each step
+        self.common_random_numbers = common_random_numbers
+        self.crn_seed = seed_random.getrandbits(32)
+        self.num_steps = 0
         self.communities = self.community_manager.communities
 
         # store the bandit agents for each community, which will be updated when they learn the messages that communities respond to
@@ -47,7 +78,54 @@ class NudgingEnv(gym.Env):
             self.message_bandit_map[self.communities[i]] = message_bandit
         
 
+    # reseed every random stream of the env (the communities' trigger words stay as they are)
+    def seed(self, seed = None):
+        seed_random = random.Random(seed)
+        self.action_space.seed(seed_random.getrandbits(32))
+        self.community_manager.seed(seed_random.getrandbits(32))
+        self.crn_seed = seed_random.getrandbits(32)
+        for community in self.communities:
+            self.message_bandit_map[community].seed(community.derive_seed())
+        return [seed]
+
+    # minimal mutable state of the env, for branching the world in lookahead search without copy.deepcopy
+    # (a surrogate backend's fitting records are shared learning state and are not part of it)
+    def get_state(self):
+        return {'communities': [community.get_state() for community in self.communities],
+                'bandits': [self.message_bandit_map[community].get_state() for community in self.communities],
+                'prev_actions': list(self.prev_actions),
+                'reward': getattr(self, 'reward', None),
+                'done': self.done,
+                'negative_reward': self.negative_reward,
+                'num_steps': self.num_steps,
+                'manager_random': self.community_manager.random.getstate(),
+                'action_space_random': get_numpy_rng_state(self.action_space.np_random)}
+
+    def set_state(self, state):
+        for community, community_state, bandit_state in zip(self.communities, state['communities'], state['bandits']):
+            community.set_state(community_state)
+            self.message_bandit_map[community].set_state(bandit_state)
+        self.prev_actions = deque(state['prev_actions'], maxlen = PREV_ACTIONS_LEN)
+        self.reward = state['reward']
+        self.done = state['done']
+        self.negative_reward = state['negative_reward']
+        self.num_steps = state['num_steps']
+        self.community_manager.random.setstate(state['manager_random'])
+        set_numpy_rng_state(self.action_space.np_random, state['action_space_random'])
+
+    # reseed the streams of the communities and their bandits from the step index, see common_random_numbers
+    def seed_step(self):
+        for community in self.communities:
+            community.seed(self.step_seed(community.id, CRN_COMMUNITY_STREAM))
+            self.message_bandit_map[community].seed(self.step_seed(community.id, CRN_BANDIT_STREAM))
+
+    def step_seed(self, community_id, stream):
+        return int(np.random.SeedSequence([self.crn_seed, community_id, self.num_steps, stream]).generate_state(1)[0])
+
     def step(self, action):
+        if self.common_random_numbers:
+            self.seed_step()
+        self.num_steps += 1
         self.prev_actions.append(action)
 
         # from the discrete action value, get the doner and recipient communities
@@ -71,7 +149,7 @@ class NudgingEnv(gym.Env):
         else:
             # check if this nudge is accepted by the communities
             self.communities[recipient].simulate_current_conditions()
-            print(f'\nCurrent conditions in Community {self.communities[recipient].id}: {self.communities[recipient].current_conditions}')
+            print(f'\nCurrent conditions in Community {self.communities[recipient].id}: {self.community_manager.catalog.describe(self.communities[recipient].current_conditions)}')
             # generate nudge message for the donor based on a bandit for this community and the current conditions for the recipient community
             message_bandit = self.message_bandit_map[self.communities[donor]]
             nudge_message, option = message_bandit.suggest(self.communities[recipient].current_conditions)
@@ -159,6 +237,7 @@ class NudgingEnv(gym.Env):
         observation = np.array(observation + list(self.prev_actions))    
         self.done = False
         self.negative_reward = 0
+        self.num_steps = 0
 
         return observation
 
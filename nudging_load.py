@@ -1,9 +1,13 @@
-from stable_baselines3 import PPO
+import sys
+from numpy_policy import load_policy
 from nudging_env import NudgingEnv
 
+# the exported policy (python numpy_policy.py models/1669330674/2570000.zip) runs without torch, an SB3 .zip can be given instead
+POLICY_PATH = sys.argv[1] if len(sys.argv) > 1 else 'models/1669330674/2570000.npz'
+
 env = NudgingEnv()
 env.reset()
-model = PPO.load('models/1669330674/2570000.zip', env = env)
+model = load_policy(POLICY_PATH, env = env)
 i = 0
 for ep in range(1):
     print(f'\n\n\n\nHELLO ep number {ep}\n\n\n')
@@ -0,0 +1,127 @@
+import argparse
+import numpy as np
+
+ACTIVATIONS = {'tanh': np.tanh,
+            'relu': lambda x: np.maximum(x, 0)}
+
+
+# torch-free copy of the actor of a trained SB3 PPO MlpPolicy, for fast evaluation and serving
+# observations go through the same layers as in SB3: flatten, hidden layers with the activation, then the action logits
+class NumpyPolicy:
+    def __init__(self, weights, biases, activation = 'tanh', rng = None):
+        if activation not in ACTIVATIONS:
+            raise ValueError(f'unsupported activation {activation}')
+        self.weights = [np.asarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activation = activation
+        self.activation_fn = ACTIVATIONS[activation]
+        self.observation_size = self.weights[0].shape[1]
+        self.num_actions = self.weights[-1].shape[0]
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    @classmethod
+    def load(cls, path, rng = None):
+        data = np.load(path)
+        num_layers = int(data['num_layers'])
+        weights = [data[f'weight_{i}'] for i in range(num_layers)]
+        biases = [data[f'bias_{i}'] for i in range(num_layers)]
+        return cls(weights, biases, str(data['activation']), rng)
+
+    def save(self, path):
+        layers = {}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            layers[f'weight_{i}'] = w
+            layers[f'bias_{i}'] = b
+        np.savez(path, num_layers = len(self.weights), activation = self.activation, **layers)
+
+    # action logits for a batch of observations
+    def logits(self, observations):
+        x = np.asarray(observations, dtype=np.float32).reshape(-1, self.observation_size)
+        for w, b in zip(self.weights[:-1], self.biases[:-1]):
+            x = self.activation_fn(x @ w.T + b)
+        return x @ self.weights[-1].T + self.biases[-1]
+
+    # same signature and defaults as the SB3 model's predict, works on a single observation or a batch
+    def predict(self, observation, state = None, episode_start = None, deterministic = False):
+        observation = np.asarray(observation)
+        logits = self.logits(observation)
+        if deterministic:
+            actions = logits.argmax(axis=1)
+        else:
+            # sample from the softmax of the logits, like the categorical distribution in SB3
+            probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+            probs /= probs.sum(axis=1, keepdims=True)
+            cum_probs = probs.cumsum(axis=1)
+            draws = self.rng.random((len(probs), 1)) * cum_probs[:, -1:]
+            actions = (cum_probs < draws).sum(axis=1)
+        if observation.ndim == 1:
+            return actions[0], state
+        return actions, state
+
+
+# read the actor weights out of a saved SB3 PPO zip, without building the model or an env
+def export_policy(zip_path, npz_path):
+    from stable_baselines3.common.save_util import load_from_zip_file
+
+    data, params, _ = load_from_zip_file(zip_path, device='cpu')
+    state_dict = params['policy']
+    activation = 'tanh'
+    policy_kwargs = data.get('policy_kwargs') or {}
+    if 'activation_fn' in policy_kwargs:
+        activation = policy_kwargs['activation_fn'].__name__.lower()
+
+    # shared layers (older SB3 versions) come before the policy layers, then the action head
+    weights = []
+    biases = []
+    for prefix in ['mlp_extractor.shared_net.', 'mlp_extractor.policy_net.']:
+        layer_ids = sorted({int(key[len(prefix):].split('.')[0]) for key in state_dict
+                            if key.startswith(prefix) and key.endswith('.weight')})
+        for layer_id in layer_ids:
+            weights.append(state_dict[f'{prefix}{layer_id}.weight'].cpu().numpy())
+            biases.append(state_dict[f'{prefix}{layer_id}.bias'].cpu().numpy())
+    weights.append(state_dict['action_net.weight'].cpu().numpy())
+    biases.append(state_dict['action_net.bias'].cpu().numpy())
+
+    policy = NumpyPolicy(weights, biases, activation)
+    policy.save(npz_path)
+    return policy
+
+
+# compare the deterministic actions of the exported policy with SB3 on random observations
+# returns the number of observations where the actions differ
+def verify_export(zip_path, policy, num_observations = 1000, seed = 0):
+    from stable_baselines3 import PPO
+
+    model = PPO.load(zip_path, device='cpu')
+    rng = np.random.default_rng(seed)
+    # resources and requirements, followed by the previous actions
+    observations = np.concatenate([rng.integers(0, 50, (num_observations, 8)),
+                                rng.integers(-1, policy.num_actions, (num_observations, policy.observation_size - 8))], axis=1).astype(np.float64)
+    expected, _ = model.predict(observations, deterministic=True)
+    actual, _ = policy.predict(observations, deterministic=True)
+    return int((expected != actual).sum())
+
+
+# load a policy for evaluation: exported .npz files do not need torch
+def load_policy(path, env = None):
+    if path.endswith('.npz'):
+        return NumpyPolicy.load(path)
+    from stable_baselines3 import PPO
+    return PPO.load(path, env = env)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Export the actor of a saved PPO policy to a torch-free .npz file.')
+    parser.add_argument('zip_path')
+    parser.add_argument('npz_path', nargs='?')
+    parser.add_argument('--verify', type = int, default = 1000, help = 'number of random observations to compare with SB3 (0 to skip)')
+    args = parser.parse_args()
+
+    npz_path = args.npz_path or args.zip_path[:-len('.zip')] + '.npz'
+    policy = export_policy(args.zip_path, npz_path)
+    print(f'Exported {len(policy.weights)} layers ({policy.activation}) to {npz_path}')
+    if args.verify:
+        mismatches = verify_export(args.zip_path, policy, args.verify)
+        print(f'{mismatches} of {args.verify} actions differ from SB3')
+        if mismatches:
+            raise SystemExit(1)
@@ -0,0 +1,156 @@
+import argparse
+import contextlib
+import math
+import os
+import numpy as np
+from evaluate_checkpoints import make_scenarios, MAX_EPISODE_STEPS
+from nudging_env import NudgingEnv
+from numpy_policy import load_policy
+
+CONFIDENCE = 0.95
+MIN_PAIRS = 5
+MAX_PAIRS = 200
+
+
+# the random agent, with the same predict signature as the trained policies
+# its action at each step is keyed by (seed, step), like the env's draws in common random numbers mode
+class RandomPolicy:
+    def __init__(self, env, seed):
+        self.env = env
+        self.seed = seed
+
+    def predict(self, observation, deterministic = True):
+        rng = np.random.default_rng([self.seed, self.env.num_steps])
+        return int(rng.integers(self.env.action_space.n)), None
+
+
+# one episode on a scenario; every stochastic component of the env (trigger words, conditions, bandit draws,
+# ACT-R noise and action sampling) is derived from the scenario's seed, and with common random numbers
+# the draws of each community at a step are the same for both policies, even after their actions differ
+def run_episode(policy_path, scenario, max_steps = MAX_EPISODE_STEPS, model = None):
+    env = NudgingEnv(scenario['available_resources'], scenario['required_resources'], seed = scenario['seed'],
+                    common_random_numbers = True)
+    model = RandomPolicy(env, scenario['seed']) if policy_path == 'random' else model
+    obs = env.reset()
+    done = False
+    num_steps = 0
+    episode_reward = 0
+    while not done and num_steps < max_steps:
+        action, _states = model.predict(obs, deterministic = True)
+        obs, reward, done, info = env.step(int(action))
+        episode_reward += reward
+        num_steps += 1
+    return episode_reward, num_steps
+
+
+# continued fraction of the regularized incomplete beta function (modified Lentz's method)
+def beta_continued_fraction(x, a, b, iterations = 300, eps = 1e-15):
+    tiny = 1e-300
+    c = 1
+    d = 1 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, iterations + 1):
+        # even and odd steps of the fraction
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                        -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1 + numerator * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= c * d
+        if abs(c * d - 1) < eps:
+            break
+    return result
+
+
+def incomplete_beta(x, a, b):
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x))
+    if x < (a + 1) / (a + b + 2):
+        return front * beta_continued_fraction(x, a, b) / a
+    return 1 - front * beta_continued_fraction(1 - x, b, a) / b
+
+
+# two-sided tail probability P(|T| > t) of Student's t distribution with df degrees of freedom
+def t_two_sided_p(t, df):
+    return incomplete_beta(df / (df + t * t), df / 2, 0.5)
+
+
+# t such that P(|T| > t) = alpha, by bisection (scipy is not a dependency of the repo)
+def t_critical_value(alpha, df):
+    high = 1.0
+    while t_two_sided_p(high, df) > alpha:
+        high *= 2
+    low = 0.0
+    for i in range(200):
+        mid = (low + high) / 2
+        if t_two_sided_p(mid, df) > alpha:
+            low = mid
+        else:
+            high = mid
+        if high - low < 1e-10 * high:
+            break
+    return (low + high) / 2
+
+
+# critical value for the n-th look at the data: the error probability is split over the looks as
+# alpha * 6 / (pi^2 n^2), which sums to alpha, so stopping at the first significant look keeps the overall confidence;
+# the standard error is estimated from the n pairs, so the quantile is Student's t with n - 1 degrees of freedom
+def sequential_threshold(n, confidence):
+    alpha_n = (1 - confidence) * 6 / (math.pi ** 2 * n ** 2)
+    return t_critical_value(alpha_n, n - 1)
+
+
+# run both policies on the same seeded scenarios until the paired reward difference is significant, or max_pairs is reached
+def paired_evaluation(policy_a, policy_b, confidence = CONFIDENCE, min_pairs = MIN_PAIRS, max_pairs = MAX_PAIRS,
+                    seed = 0, max_steps = MAX_EPISODE_STEPS):
+    scenarios = make_scenarios(max_pairs, seed)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        models = {path: None if path == 'random' else load_policy(path) for path in (policy_a, policy_b)}
+        reward_diffs = []
+        step_diffs = []
+        significant = False
+        for n, scenario in enumerate(scenarios, start = 1):
+            reward_a, steps_a = run_episode(policy_a, scenario, max_steps, models[policy_a])
+            reward_b, steps_b = run_episode(policy_b, scenario, max_steps, models[policy_b])
+            reward_diffs.append(reward_b - reward_a)
+            step_diffs.append(steps_b - steps_a)
+            if n >= max(min_pairs, 2):
+                std = np.std(reward_diffs, ddof = 1)
+                if std == 0:
+                    significant = np.mean(reward_diffs) != 0
+                else:
+                    significant = abs(np.mean(reward_diffs)) / (std / math.sqrt(n)) > sequential_threshold(n, confidence)
+                if significant:
+                    break
+
+    n = len(reward_diffs)
+    return {'pairs': n,
+            'significant': bool(significant),
+            'mean_reward_diff': float(np.mean(reward_diffs)),
+            'reward_diff_se': float(np.std(reward_diffs, ddof = 1) / math.sqrt(n)) if n > 1 else None,
+            'mean_step_diff': float(np.mean(step_diffs)),
+            'step_diff_se': float(np.std(step_diffs, ddof = 1) / math.sqrt(n)) if n > 1 else None}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Compare two policies on paired episodes with common random numbers, stopping once the difference is significant.')
+    parser.add_argument('policy_a', help = "'random', an exported .npz policy or an SB3 .zip")
+    parser.add_argument('policy_b', help = "'random', an exported .npz policy or an SB3 .zip")
+    parser.add_argument('--confidence', type = float, default = CONFIDENCE)
+    parser.add_argument('--min-pairs', type = int, default = MIN_PAIRS)
+    parser.add_argument('--max-pairs', type = int, default = MAX_PAIRS)
+    parser.add_argument('--max-steps', type = int, default = MAX_EPISODE_STEPS)
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+
+    result = paired_evaluation(args.policy_a, args.policy_b, args.confidence, args.min_pairs, args.max_pairs, args.seed, args.max_steps)
+    print(f"Pairs: {result['pairs']} \t significant at {args.confidence}: {result['significant']}")
+    # the standard errors need at least two pairs
+    for name, key in (('Reward', 'reward_diff'), ('Step', 'step_diff')):
+        se = result[f'{key}_se']
+        print(f"{name} difference (b - a): {result[f'mean_{key}']:.1f}" + (f' +- {se:.1f}' if se is not None else ''))
@@ -1,33 +1,22 @@
-from stable_baselines3 import PPO
+import sys
+from numpy_policy import load_policy
 from nudging_env import NudgingEnv
 from copy import deepcopy
-import random
+from community_manager import random_insufficient_resources
 
-TOTAL_RESOURCES_AVAILABLE = 120
-TOTAL_RESOURCES_REQUIRED = 100
-NUM_COMMUNITIES = 4
+# the exported policy (python numpy_policy.py models/1669480859/2690000.zip) runs without torch, an SB3 .zip can be given instead
+POLICY_PATH = sys.argv[1] if len(sys.argv) > 1 else 'models/1669480859/2690000.npz'
 
 # compare random and trained agent
 num_of_steps = []
 rewards = []
 NUM_EPS = 3
 
-# checks that the overall distribution is insufficient
-def insufficient(available_resources, required_resources):
-    for i in range(NUM_COMMUNITIES):
-        if available_resources[i] < required_resources[i]:
-            return True
-    return False
-
 for episode in range(NUM_EPS):
-    while True:
-        available_resources = [random.randint(0,TOTAL_RESOURCES_AVAILABLE//4) for i in range(NUM_COMMUNITIES)]
-        required_resources = [random.randint(0,TOTAL_RESOURCES_REQUIRED//4) for i in range(NUM_COMMUNITIES)]
-        if insufficient(available_resources, required_resources):
-            break
+    available_resources, required_resources = random_insufficient_resources()
     env_random = NudgingEnv(available_resources, required_resources)
     env_learned = NudgingEnv(available_resources, required_resources)
-    model = PPO.load('models/1669480859/2690000.zip', env = env_learned)
+    model = load_policy(POLICY_PATH, env = env_learned)
     num_steps = 0
     curr_episode_steps = []
     curr_episode_reward = []
@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import json
+import math
+import time
+from collections import deque
+import numpy as np
+from community_manager import CommunityManager
+from message_bandit import MessageBandit
+from nudging_env import PREV_ACTIONS_LEN
+from numpy_policy import load_policy
+
+NUM_COMMUNITIES = 4
+HOST = '127.0.0.1'
+PORT = 8765
+BATCH_WINDOW_MS = 2 # how long the first request of a batch waits for others
+MAX_BATCH_SIZE = 64
+LATENCY_WINDOW = 10000 # latencies kept for the percentiles
+OBSERVATION_SIZE = 8 + PREV_ACTIONS_LEN # resources of the communities and the previous actions, as in NudgingEnv
+
+
+# coalesces concurrent predictions into one batched policy call
+class MicroBatcher:
+    def __init__(self, policy, window_ms = BATCH_WINDOW_MS, max_batch_size = MAX_BATCH_SIZE):
+        self.policy = policy
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.queue = asyncio.Queue()
+        self.batch_sizes = deque(maxlen = LATENCY_WINDOW)
+
+    async def predict(self, observation):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((observation, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                observations = np.array([observation for observation, _ in batch], dtype=np.float64)
+                actions, _states = self.policy.predict(observations, deterministic = True)
+            except Exception as e:
+                # the requests of a failed batch get the error, the batcher keeps running
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batch_sizes.append(len(batch))
+            for (_, future), action in zip(batch, actions):
+                if not future.done():
+                    future.set_result(int(action))
+
+
+# serves nudge recommendations from a trained policy and the per-community message bandits
+# the protocol is one json object per line:
+#   {"type": "recommend", "observation": [38 values], "conditions": [[condition ids present in community 0], ...]}
+#   {"type": "feedback", "donor": 0, "option": 2, "accepted": true}
+#   {"type": "metrics"}
+class RecommendationServer:
+    def __init__(self, policy, window_ms = BATCH_WINDOW_MS, max_batch_size = MAX_BATCH_SIZE, seed = None):
+        self.batcher = MicroBatcher(policy, window_ms, max_batch_size)
+        self.community_manager = CommunityManager(seed = seed)
+        self.communities = self.community_manager.communities
+        self.bandits = [MessageBandit(community) for community in self.communities]
+        self.feedback = asyncio.Queue()
+        self.latencies = deque(maxlen = LATENCY_WINDOW)
+        self.num_requests = 0
+        self.num_feedback = 0
+        self.start_time = time.perf_counter()
+        self.tasks = []
+
+    def convert_action(self, action):
+        return self.communities[0].convert_action(action)
+
+    # malformed requests are answered with an error before they reach the batcher, so they cannot fail a whole batch
+    def validate_recommend(self, request):
+        observation = request.get('observation')
+        if not isinstance(observation, list) or len(observation) != OBSERVATION_SIZE:
+            return f'observation must be a list of {OBSERVATION_SIZE} values'
+        if not all(isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value) for value in observation):
+            return 'observation values must be finite numbers'
+        conditions = request.get('conditions')
+        if not isinstance(conditions, list) or len(conditions) != NUM_COMMUNITIES or not all(isinstance(c, list) for c in conditions):
+            return f'conditions must be a list of {NUM_COMMUNITIES} lists of condition ids'
+        num_conditions = self.community_manager.catalog.num_conditions
+        for community_conditions in conditions:
+            for condition in community_conditions:
+                if not isinstance(condition, int) or isinstance(condition, bool) or not 0 <= condition < num_conditions:
+                    return f'condition ids must be between 0 and {num_conditions - 1}'
+        return None
+
+    def validate_feedback(self, request):
+        donor = request.get('donor')
+        if not isinstance(donor, int) or isinstance(donor, bool) or not 0 <= donor < NUM_COMMUNITIES:
+            return f'donor must be a community id between 0 and {NUM_COMMUNITIES - 1}'
+        option = request.get('option')
+        num_messages = self.community_manager.catalog.num_messages
+        if not isinstance(option, int) or isinstance(option, bool) or not -1 <= option < num_messages:
+            return f'option must be -1 or a message id between 0 and {num_messages - 1}'
+        if not isinstance(request.get('accepted'), bool):
+            return 'accepted must be true or false'
+        return None
+
+    async def recommend(self, request):
+        action = await self.batcher.predict(request['observation'])
+        [donor, recipient] = self.convert_action(action)
+        message, option = self.bandits[donor].suggest(request['conditions'][recipient])
+        return {'action': action, 'donor': donor, 'recipient': recipient, 'message': message, 'option': option}
+
+    # feedback is queued and applied by a background task, so recommendations never wait for it
+    async def apply_feedback(self):
+        while True:
+            donor, option, accepted = await self.feedback.get()
+            try:
+                self.bandits[donor].learn(option, accepted)
+                self.num_feedback += 1
+            except Exception as e:
+                # one bad update must not stop the learning from later feedback
+                print(f'Failed to apply feedback (donor {donor}, option {option}): {e!r}')
+
+    def metrics(self):
+        latencies = np.array(self.latencies) * 1000
+        batch_sizes = self.batcher.batch_sizes
+        elapsed = time.perf_counter() - self.start_time
+        return {'requests': self.num_requests,
+                'feedback': self.num_feedback,
+                'throughput': self.num_requests / elapsed if elapsed > 0 else 0,
+                'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+                'mean_batch_size': float(np.mean(batch_sizes)) if batch_sizes else None}
+
+    async def handle_request(self, request):
+        if request['type'] == 'recommend':
+            error = self.validate_recommend(request)
+            if error:
+                return {'error': error}
+            start = time.perf_counter()
+            response = await self.recommend(request)
+            self.latencies.append(time.perf_counter() - start)
+            self.num_requests += 1
+            return response
+        if request['type'] == 'feedback':
+            error = self.validate_feedback(request)
+            if error:
+                return {'error': error}
+            self.feedback.put_nowait((request['donor'], request['option'], request['accepted']))
+            return {'ok': True}
+        if request['type'] == 'metrics':
+            return self.metrics()
+        raise ValueError(f"unknown request type {request['type']}")
+
+    # requests on one connection are handled concurrently, responses carry the request's id if it has one
+    async def handle_connection(self, reader, writer):
+        pending = set()
+        async def respond(request):
+            try:
+                response = await self.handle_request(request)
+            except Exception as e:
+                response = {'error': str(e)}
+            if 'id' in request:
+                response['id'] = request['id']
+            writer.write((json.dumps(response) + '\n').encode())
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    writer.write((json.dumps({'error': str(e)}) + '\n').encode())
+                    continue
+                if not isinstance(request, dict):
+                    writer.write((json.dumps({'error': 'request must be a json object'}) + '\n').encode())
+                    continue
+                task = asyncio.ensure_future(respond(request))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                await writer.drain()
+            if pending:
+                await asyncio.gather(*pending)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host = HOST, port = PORT):
+        self.tasks = [asyncio.ensure_future(self.batcher.run()), asyncio.ensure_future(self.apply_feedback())]
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        self.start_time = time.perf_counter()
+        return server
+
+
+async def main(args):
+    server = RecommendationServer(load_policy(args.policy), args.window_ms, args.max_batch_size, args.seed)
+    tcp_server = await server.serve(args.host, args.port)
+    print(f'Serving recommendations on {args.host}:{args.port}')
+    async with tcp_server:
+        await tcp_server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Serve nudge recommendations from a trained policy and the message bandits.')
+    parser.add_argument('policy', help = 'exported .npz policy (see numpy_policy.py) or SB3 .zip')
+    parser.add_argument('--host', default = HOST)
+    parser.add_argument('--port', type = int, default = PORT)
+    parser.add_argument('--window-ms', type = float, default = BATCH_WINDOW_MS)
+    parser.add_argument('--max-batch-size', type = int, default = MAX_BATCH_SIZE)
+    parser.add_argument('--seed', type = int, default = None)
+    args = parser.parse_args()
+    asyncio.run(main(args))
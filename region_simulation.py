@@ -0,0 +1,189 @@
+import argparse
+import multiprocessing as mp
+import os
+import random
+import sys
+import time
+import numpy as np
+from nudging_env import NudgingEnv, NUM_COMMUNITIES
+
+SYNC_INTERVAL = 100 # steps each region takes on its own between exchanges
+CROSS_REGION_DONATION_PROB = 0.05 # inter-region donations are rare
+INITIAL_REGION_SENTIMENT = 0.5
+SENTIMENT_DRIFT = 0.1 # how far a region's sentiments towards other regions move towards its communities' mood at each sync
+
+
+# each region is a group of communities stepped by its own NudgingEnv in a separate process
+# the worker only talks to the coordinator at sync points, through its end of a pipe
+def region_worker(region_id, conn, seed, quiet = True, donation_prob = CROSS_REGION_DONATION_PROB):
+    if quiet:
+        # the env prints every step, which would only slow the workers down
+        sys.stdout = open(os.devnull, 'w')
+    env = NudgingEnv(seed = seed)
+    env.reset()
+    rng = random.Random(seed)
+    region_sentiments = None # this region's sentiments towards every region, kept by the coordinator
+    steps = 0
+    episodes = 0
+    total_reward = 0
+
+    while True:
+        command, payload = conn.recv()
+        if command == 'step':
+            for i in range(payload):
+                obs, reward, done, info = env.step(env.action_space.sample())
+                steps += 1
+                total_reward += reward
+                if done:
+                    episodes += 1
+                    env.reset()
+            conn.send(region_report(region_id, env, steps, episodes, total_reward))
+
+        elif command == 'propose':
+            # the donor region decides on the proposals, more likely to give to regions it feels positive about
+            proposals, region_sentiments = payload
+            accepted = []
+            for donor, recipient_region, recipient in proposals:
+                community = env.communities[donor]
+                if community.available_resources <= community.required_resources:
+                    continue
+                if rng.random() < donation_prob * region_sentiments[recipient_region]:
+                    community.available_resources -= 1
+                    accepted.append((donor, recipient_region, recipient))
+            conn.send(accepted)
+
+        elif command == 'receive':
+            for community_id in payload:
+                env.communities[community_id].available_resources += 1
+            conn.send(None)
+
+        elif command == 'close':
+            conn.close()
+            return
+
+
+# what a region tells the coordinator at a sync point
+def region_report(region_id, env, steps, episodes, total_reward):
+    surplus = [community.available_resources - community.required_resources for community in env.communities]
+    # average sentiment between different communities in the region
+    sentiment = np.mean([env.communities[i].sentiments[j] for i in range(NUM_COMMUNITIES) for j in range(NUM_COMMUNITIES) if i != j])
+    return {'region': region_id,
+            'steps': steps,
+            'episodes': episodes,
+            'reward': total_reward,
+            'surplus': surplus,
+            'sentiment': sentiment}
+
+
+# coordinator matching cross-region transfer proposals and keeping the sentiments between regions
+class RegionCoordinator:
+    def __init__(self, num_regions):
+        self.num_regions = num_regions
+        self.region_sentiments = [[1 if i == j else INITIAL_REGION_SENTIMENT for j in range(num_regions)] for i in range(num_regions)]
+        self.num_transfers = 0
+
+    # a region's sentiments towards other regions drift towards the mood its communities report
+    def update_sentiments(self, reports):
+        for report in reports:
+            i = report['region']
+            for j in range(self.num_regions):
+                if i != j:
+                    self.region_sentiments[i][j] += SENTIMENT_DRIFT * (report['sentiment'] - self.region_sentiments[i][j])
+
+    # every community short of resources proposes to receive one unit from the community with the largest surplus in another region
+    # returns the proposals per donor region, as (donor community, recipient region, recipient community)
+    def propose(self, reports):
+        proposals = [[] for i in range(self.num_regions)]
+        surplus = [list(report['surplus']) for report in reports]
+        for recipient_region in range(self.num_regions):
+            for recipient, recipient_surplus in enumerate(surplus[recipient_region]):
+                if recipient_surplus >= 0:
+                    continue
+                best = None
+                for donor_region in range(self.num_regions):
+                    if donor_region == recipient_region:
+                        continue
+                    for donor, donor_surplus in enumerate(surplus[donor_region]):
+                        if donor_surplus > 0 and (best is None or donor_surplus > surplus[best[0]][best[1]]):
+                            best = (donor_region, donor)
+                if best is None:
+                    continue
+                donor_region, donor = best
+                proposals[donor_region].append((donor, recipient_region, recipient))
+                surplus[donor_region][donor] -= 1
+        return proposals
+
+    # accepted donations, per donor region, become receipts per recipient region
+    def settle(self, accepted):
+        receipts = [[] for i in range(self.num_regions)]
+        for donor_region, donations in enumerate(accepted):
+            for donor, recipient_region, recipient in donations:
+                receipts[recipient_region].append(recipient)
+                # increase recipient region's sentiments towards donor region
+                self.region_sentiments[recipient_region][donor_region] = min(self.region_sentiments[recipient_region][donor_region] * 1.0001, 1)
+                self.num_transfers += 1
+        return receipts
+
+
+# step all regions in parallel, exchanging transfers and sentiments every sync_interval steps
+def run_regions(num_regions, num_syncs, sync_interval = SYNC_INTERVAL, seed = 0, quiet = True):
+    coordinator = RegionCoordinator(num_regions)
+    connections = []
+    workers = []
+    for region_id in range(num_regions):
+        parent_conn, child_conn = mp.Pipe()
+        worker = mp.Process(target = region_worker, args = (region_id, child_conn, seed + region_id + 1, quiet), daemon = True)
+        worker.start()
+        child_conn.close()
+        connections.append(parent_conn)
+        workers.append(worker)
+
+    start = time.perf_counter()
+    reports = []
+    for sync in range(num_syncs):
+        # regions step independently until the next sync point
+        for conn in connections:
+            conn.send(('step', sync_interval))
+        reports = [conn.recv() for conn in connections]
+
+        # regions exchange sentiments and transfers through the coordinator
+        coordinator.update_sentiments(reports)
+        proposals = coordinator.propose(reports)
+        for region_id, conn in enumerate(connections):
+            conn.send(('propose', (proposals[region_id], coordinator.region_sentiments[region_id])))
+        receipts = coordinator.settle([conn.recv() for conn in connections])
+        for region_id, conn in enumerate(connections):
+            conn.send(('receive', receipts[region_id]))
+        for conn in connections:
+            conn.recv()
+    elapsed = time.perf_counter() - start
+
+    for conn in connections:
+        conn.send(('close', None))
+    for worker in workers:
+        worker.join()
+
+    total_steps = sum(report['steps'] for report in reports)
+    return {'reports': reports,
+            'region_sentiments': coordinator.region_sentiments,
+            'transfers': coordinator.num_transfers,
+            'steps': total_steps,
+            'elapsed': elapsed,
+            'steps_per_second': total_steps / elapsed if elapsed > 0 else 0}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Simulate many regions of communities in parallel worker processes.')
+    parser.add_argument('--regions', type = int, default = os.cpu_count())
+    parser.add_argument('--syncs', type = int, default = 10)
+    parser.add_argument('--sync-interval', type = int, default = SYNC_INTERVAL)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--verbose', action = 'store_true', help = 'keep the env output of the workers')
+    args = parser.parse_args()
+
+    result = run_regions(args.regions, args.syncs, args.sync_interval, args.seed, quiet = not args.verbose)
+    print('REGION\t STEPS\t EPISODES\t REWARD\t SENTIMENT')
+    for report in result['reports']:
+        print(f"{report['region']}\t {report['steps']}\t {report['episodes']}\t {report['reward']}\t {report['sentiment']:.4f}")
+    print(f"\nCross-region transfers: {result['transfers']}")
+    print(f"Throughput: {result['steps_per_second']:.1f} steps/s over {result['elapsed']:.2f}s")
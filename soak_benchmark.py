@@ -0,0 +1,54 @@
+import argparse
+import contextlib
+import gc
+import os
+import time
+import tracemalloc
+from nudging_env import NudgingEnv
+
+NUM_STEPS = 20000
+WARMUP_STEPS = 1000
+NUM_SAMPLES = 10
+MAX_GROWTH_KB = 256
+
+
+# step one long-lived env with random actions (communities stay the same over episodes, as in training)
+# and sample the memory traced by tracemalloc, returning the samples taken after the warmup
+def soak(num_steps = NUM_STEPS, warmup_steps = WARMUP_STEPS, num_samples = NUM_SAMPLES, seed = 0):
+    env = NudgingEnv(seed = seed)
+    sample_every = max(1, num_steps // num_samples)
+    samples = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        env.reset()
+        tracemalloc.start()
+        for step in range(warmup_steps + num_steps):
+            obs, reward, done, info = env.step(env.action_space.sample())
+            if done:
+                env.reset()
+            if step >= warmup_steps and (step - warmup_steps) % sample_every == 0:
+                gc.collect()
+                samples.append((step - warmup_steps, tracemalloc.get_traced_memory()[0]))
+        gc.collect()
+        samples.append((num_steps, tracemalloc.get_traced_memory()[0]))
+        tracemalloc.stop()
+    return samples
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Check that memory stays flat over many NudgingEnv steps.')
+    parser.add_argument('--steps', type = int, default = NUM_STEPS)
+    parser.add_argument('--warmup', type = int, default = WARMUP_STEPS)
+    parser.add_argument('--samples', type = int, default = NUM_SAMPLES)
+    parser.add_argument('--max-growth-kb', type = float, default = MAX_GROWTH_KB, help = 'allowed growth after the warmup')
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    samples = soak(args.steps, args.warmup, args.samples, args.seed)
+    elapsed = time.perf_counter() - start
+    print('STEP\t TRACED KB')
+    for step, traced in samples:
+        print(f'{step}\t {traced / 1024:.1f}')
+    growth_kb = (max(traced for _, traced in samples) - samples[0][1]) / 1024
+    print(f'\nGrowth after warmup: {growth_kb:.1f} KB over {args.steps} steps ({elapsed:.1f}s)')
+    assert growth_kb <= args.max_growth_kb, f'memory grew by {growth_kb:.1f} KB, more than {args.max_growth_kb} KB'
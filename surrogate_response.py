@@ -0,0 +1,210 @@
+import argparse
+import contextlib
+import json
+import os
+from collections import deque
+import numpy as np
+from community_model import CommunityModel, DONOR_PRODUCTIONS, RECIPIENT_PRODUCTIONS
+
+MIN_SAMPLES = 20 # states with fewer recorded responses use the model pooled over all states
+RIDGE = 1e-3
+REFIT_INTERVAL = 500 # new pyactr responses between refits
+MAX_RECORDS = 50000 # most recent pyactr responses kept for fitting
+UTILITY_SCALE = 10 # scale of utility differences, keeps the logistic fit well conditioned
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+# logistic regression of acceptance on the scaled utility difference, fitted with Newton's method and a small ridge penalty
+def fit_logistic(utility_diffs, accepted, iterations = 25):
+    X = np.column_stack([np.ones(len(utility_diffs)), np.asarray(utility_diffs, dtype=float) / UTILITY_SCALE])
+    y = np.asarray(accepted, dtype=float)
+    params = np.zeros(2)
+    for i in range(iterations):
+        p = sigmoid(X @ params)
+        gradient = X.T @ (p - y) + RIDGE * len(y) * params
+        hessian = (X * (p * (1 - p))[:, None]).T @ X + RIDGE * len(y) * np.eye(2)
+        step = np.linalg.solve(hessian, gradient)
+        params -= step
+        if np.abs(step).max() < 1e-8:
+            break
+    return params
+
+
+def state_key(record):
+    return (record['role'], record['sentiment'], record['resources'], float(record['trigger_factor']))
+
+
+# surrogate acceptance model: a logistic model on the utility difference of the accept and reject productions,
+# fitted per discrete state (role, sentiment bucket, resource state, trigger factor)
+class SurrogateResponseModel:
+    def __init__(self, params = None, pooled_params = None):
+        self.params = params or {}
+        self.pooled_params = pooled_params if pooled_params is not None else np.zeros(2)
+
+    def fit(self, records):
+        records = list(records)
+        if not records:
+            return self
+        diffs = [record['utility_accept'] - record['utility_reject'] for record in records]
+        self.pooled_params = fit_logistic(diffs, [record['accepted'] for record in records])
+        by_state = {}
+        for record, diff in zip(records, diffs):
+            by_state.setdefault(state_key(record), []).append((diff, record['accepted']))
+        self.params = {}
+        for key, samples in by_state.items():
+            if len(samples) >= MIN_SAMPLES:
+                state_diffs, state_accepted = zip(*samples)
+                self.params[key] = fit_logistic(state_diffs, state_accepted)
+        return self
+
+    def accept_probability(self, record):
+        params = self.params.get(state_key(record), self.pooled_params)
+        diff = (record['utility_accept'] - record['utility_reject']) / UTILITY_SCALE
+        return float(sigmoid(params[0] + params[1] * diff))
+
+    def save(self, path):
+        data = {'pooled': list(self.pooled_params),
+                'states': [[list(key), list(params)] for key, params in self.params.items()]}
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        params = {(role, sentiment, resources, float(trigger_factor)): np.array(state_params)
+                for (role, sentiment, resources, trigger_factor), state_params in data['states']}
+        return cls(params, np.array(data['pooled']))
+
+
+# compare the model's acceptance probabilities with recorded pyactr responses
+def validate(model, records):
+    records = list(records)
+    if not records:
+        return {'samples': 0, 'log_loss': None, 'observed_rate': None, 'predicted_rate': None}
+    probs = np.clip([model.accept_probability(record) for record in records], 1e-6, 1 - 1e-6)
+    accepted = np.array([record['accepted'] for record in records], dtype=float)
+    return {'samples': len(records),
+            'log_loss': float(-np.mean(accepted * np.log(probs) + (1 - accepted) * np.log(1 - probs))),
+            'observed_rate': float(accepted.mean()),
+            'predicted_rate': float(probs.mean())}
+
+
+# shared by the communities of an env: decides which responses go to pyactr, keeps their records and refits the model
+class SurrogateBackend:
+    def __init__(self, model = None, fidelity = 0.05, refit_interval = REFIT_INTERVAL, max_records = MAX_RECORDS):
+        self.model = model
+        self.fidelity = fidelity # fraction of responses simulated with pyactr, 1 runs everything on pyactr
+        self.refit_interval = refit_interval
+        self.records = deque(maxlen = max_records)
+        self.new_records = []
+        self.last_validation = None
+
+    def use_actr(self, rng):
+        return self.model is None or rng.random() < self.fidelity
+
+    # pyactr responses are held out until the next refit, so they also validate the current model
+    def observe(self, record):
+        self.new_records.append(record)
+        if len(self.new_records) >= self.refit_interval:
+            self.refit()
+
+    def refit(self):
+        if self.model is not None:
+            self.last_validation = validate(self.model, self.new_records)
+        self.records.extend(self.new_records)
+        self.new_records = []
+        self.model = (self.model or SurrogateResponseModel()).fit(self.records)
+
+
+# community model answering from the surrogate, except for a fraction of responses simulated with pyactr
+class SurrogateCommunityModel(CommunityModel):
+    def __init__(self, id, karma_points, catalog = None, seed = None, backend = None, **kwargs):
+        super(SurrogateCommunityModel, self).__init__(id, karma_points, catalog, seed, **kwargs)
+        self.backend = backend if backend is not None else SurrogateBackend()
+        self.response_log = []
+
+    def get_response(self, action, nudge_message = None):
+        if self.backend.use_actr(self.np_random):
+            response = super(SurrogateCommunityModel, self).get_response(action, nudge_message)
+            self.backend.observe(self.response_log.pop())
+            return response
+        return self.sample_response(action, nudge_message)
+
+    # same effects as the pyactr simulation: a fired production, the recipient's sentiment update and utility learning
+    def sample_response(self, action, nudge_message = None):
+        is_donor = False
+        if nudge_message:
+            is_donor = True
+            self.nudge_message = nudge_message
+        [self.donor, self.recipient] = self.convert_action(action)
+
+        sentiment, resources = self.response_state(is_donor)
+        self.response = None # not decided yet, the record only provides the features here
+        record = self.response_record(is_donor, sentiment, resources)
+        self.response = bool(self.np_random.random() < self.backend.model.accept_probability(record))
+
+        accept_index, reject_index = self.response_utility_indices(is_donor, sentiment, resources)
+        fired_index = accept_index if self.response else reject_index
+        if is_donor:
+            self.fired_production = DONOR_PRODUCTIONS[fired_index]
+        else:
+            self.fired_production = RECIPIENT_PRODUCTIONS[fired_index - 12]
+        print(f'\nCommunity {self.id}')
+        print(f'SURROGATE PRODUCTION FIRED: {self.fired_production}')
+        # the reward is set before the recipient's sentiments change, as for the pyactr productions
+        reward = self.calculate_reward(self.fired_production)
+
+        if self.response and not is_donor:
+            # increase recipient's sentiments towards donor
+            self.sentiments[self.donor] = min(self.sentiments[self.donor] * 1.0001, 1)
+            self.sentiment_val = self.sentiments[self.donor]
+
+        # utility learning as in pyactr: the fired production moves towards its reward, minus the time to fire
+        parameters = self.actr_response_model.model_parameters
+        utility = self.utilities[fired_index]
+        self.utilities[fired_index] = round(utility + parameters['utility_alpha'] * (reward - parameters['rule_firing'] - utility), 4)
+        return self.response
+
+
+# record pyactr responses from a seeded env stepped with random actions
+def record_responses(num_steps, seed = 0):
+    from nudging_env import NudgingEnv
+
+    records = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        env = NudgingEnv(seed = seed)
+        for community in env.communities:
+            community.response_log = records
+        env.reset()
+        for i in range(num_steps):
+            obs, reward, done, info = env.step(env.action_space.sample())
+            if done:
+                env.reset()
+    return records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Fit or validate a surrogate acceptance model from recorded pyactr responses.')
+    subparsers = parser.add_subparsers(dest = 'command', required = True)
+    fit = subparsers.add_parser('fit', help = 'record pyactr responses and fit a surrogate model')
+    fit.add_argument('path')
+    fit.add_argument('--steps', type = int, default = 5000)
+    fit.add_argument('--seed', type = int, default = 0)
+    check = subparsers.add_parser('validate', help = 'compare a surrogate model with freshly recorded pyactr responses')
+    check.add_argument('path')
+    check.add_argument('--steps', type = int, default = 2000)
+    check.add_argument('--seed', type = int, default = 1)
+    args = parser.parse_args()
+
+    records = record_responses(args.steps, args.seed)
+    if args.command == 'fit':
+        model = SurrogateResponseModel().fit(records)
+        model.save(args.path)
+        print(f'Fitted {len(model.params)} states from {len(records)} responses to {args.path}')
+    else:
+        result = validate(SurrogateResponseModel.load(args.path), records)
+        print(f"{result['samples']} responses: log loss {result['log_loss']:.4f}, observed acceptance {result['observed_rate']:.4f}, predicted {result['predicted_rate']:.4f}")
@@ -0,0 +1,61 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+
+# vectorized env stepping its envs on a thread pool, a lighter alternative to SubprocVecEnv when memory is tight
+# the envs must not share state, e.g. NudgingEnv instances each with their own seed
+class ThreadVecEnv(VecEnv):
+    def __init__(self, env_fns, num_threads = None):
+        self.envs = [fn() for fn in env_fns]
+        env = self.envs[0]
+        super(ThreadVecEnv, self).__init__(len(self.envs), env.observation_space, env.action_space)
+        self.executor = ThreadPoolExecutor(max_workers = num_threads or len(self.envs))
+        self.actions = None
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        results = list(self.executor.map(self.step_env, range(self.num_envs), self.actions))
+        observations, rewards, dones, infos = zip(*results)
+        return np.stack(observations), np.array(rewards, dtype=np.float32), np.array(dones), list(infos)
+
+    # step one env, resetting it at the end of an episode like DummyVecEnv does
+    def step_env(self, env_idx, action):
+        env = self.envs[env_idx]
+        observation, reward, done, info = env.step(action)
+        if done:
+            info['terminal_observation'] = observation
+            observation = env.reset()
+        return observation, reward, done, info
+
+    def reset(self):
+        return np.stack(list(self.executor.map(lambda env: env.reset(), self.envs)))
+
+    def seed(self, seed = None):
+        if seed is None:
+            seed = np.random.randint(0, 2**32 - 1)
+        return [env.seed(seed + idx) for idx, env in enumerate(self.envs)]
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+        self.executor.shutdown()
+
+    def get_images(self):
+        return [env.render(mode='rgb_array') for env in self.envs]
+
+    def get_attr(self, attr_name, indices = None):
+        return [getattr(self.envs[i], attr_name) for i in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices = None):
+        for i in self._get_indices(indices):
+            setattr(self.envs[i], attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices = None, **method_kwargs):
+        return [getattr(self.envs[i], method_name)(*method_args, **method_kwargs) for i in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices = None):
+        from stable_baselines3.common import env_util
+        return [env_util.is_wrapped(self.envs[i], wrapper_class) for i in self._get_indices(indices)]